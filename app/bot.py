@@ -7,11 +7,13 @@ import os
 import sys
 import asyncio
 import logging
-from pathlib import Path
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
 from aiogram.client.default import DefaultBotProperties
 from dotenv import load_dotenv
 
@@ -20,6 +22,18 @@ load_dotenv()
 
 # Импортируем роутеры обработчиков
 from app.handlers import start, files, callbacks
+from app.utils.converter_logic import (
+    CPU_WORKERS,
+    start_pandoc_server,
+    stop_pandoc_server,
+    shutdown_pools
+)
+
+# Типы обновлений, которые обрабатывает бот (остальные Telegram не присылает)
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+# Таймаут long-polling в секундах: меньше пустых запросов getUpdates
+POLLING_TIMEOUT = 60
 
 
 def setup_logging() -> None:
@@ -67,6 +81,60 @@ def get_bot_token() -> str:
     return token
 
 
+class PooledAiohttpSession(AiohttpSession):
+    """
+    Сессия aiogram с увеличенным пулом соединений
+    Все запросы идут на один хост (api.telegram.org), поэтому
+    поднимаем лимит на хост и держим соединения открытыми
+    """
+    
+    def __init__(self, **kwargs) -> None:
+        super().__init__(limit=128, **kwargs)
+        
+        # Параметры коннектора дополняются до создания сессии:
+        # заголовки, прокси и пересоздание коннектора остаются за aiogram
+        self._connector_init.update(
+            limit_per_host=64,
+            keepalive_timeout=75,
+            ttl_dns_cache=3600,
+            # Закрываем SSL-соединения, которые сервер оборвал без ответа
+            enable_cleanup_closed=True,
+        )
+
+
+def create_bot_session() -> AiohttpSession:
+    """
+    Создаёт HTTP-сессию бота с увеличенным пулом соединений
+    Одна сессия используется для всех запросов к Bot API,
+    скачивания и отправки файлов, соединения переиспользуются (keep-alive)
+    
+    Returns:
+        Настроенная сессия aiohttp для aiogram
+    """
+    return PooledAiohttpSession()
+
+
+def create_storage() -> BaseStorage:
+    """
+    Создаёт хранилище FSM
+    Если задан REDIS_URL, состояние хранится в Redis и переживает
+    перезапуск бота (и доступно нескольким репликам), иначе - в памяти
+    
+    Returns:
+        Хранилище для FSM
+    """
+    redis_url = os.getenv("REDIS_URL")
+    
+    if not redis_url:
+        return MemoryStorage()
+    
+    return RedisStorage.from_url(
+        redis_url,
+        connection_kwargs={"socket_keepalive": True},
+        key_builder=DefaultKeyBuilder(with_bot_id=True)
+    )
+
+
 async def main() -> None:
     """
     Главная функция запуска бота
@@ -90,11 +158,13 @@ async def main() -> None:
     # Создаём экземпляр бота с настройками по умолчанию
     bot = Bot(
         token=bot_token,
+        session=create_bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
-    # Создаём хранилище для FSM (в памяти)
-    storage = MemoryStorage()
+    # Создаём хранилище для FSM (Redis или память)
+    storage = create_storage()
+    logger.info("💾 Хранилище FSM: %s", type(storage).__name__)
     
     # Создаём диспетчер
     dp = Dispatcher(storage=storage)
@@ -107,18 +177,31 @@ async def main() -> None:
     
     logger.info("✅ Роутеры обработчиков зарегистрированы")
     
+    # Конвертации на CPU идут в пул процессов converter_logic.
+    # Семафор ограничивает число одновременных конвертаций его размером
+    dp["conversion_semaphore"] = asyncio.Semaphore(CPU_WORKERS)
+    logger.info("⚙️ Процессов для конвертации: %d", CPU_WORKERS)
+    
     # Выводим информацию о лимите файлов
     max_file_size = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
-    logger.info(f"📁 Максимальный размер файла: {max_file_size} МБ")
+    logger.info("📁 Максимальный размер файла: %d МБ", max_file_size)
     
     # Получаем информацию о боте
     try:
         bot_info = await bot.get_me()
-        logger.info(f"🤖 Бот: @{bot_info.username} (ID: {bot_info.id})")
+        logger.info("🤖 Бот: @%s (ID: %d)", bot_info.username, bot_info.id)
     except Exception as e:
-        logger.error(f"❌ Ошибка получения информации о боте: {e}")
+        logger.error("❌ Ошибка получения информации о боте: %s", e)
         sys.exit(1)
     
+    # Постоянный pandoc server для документов (если Pandoc его поддерживает).
+    # Запускается после проверки токена: при выходе по ошибке выше
+    # дочерний процесс не остаётся висеть. Порт 0 - любой свободный
+    await start_pandoc_server(
+        int(os.getenv("PANDOC_SERVER_PORT", "0")),
+        int(os.getenv("PANDOC_SERVER_TIMEOUT", "120"))
+    )
+    
     logger.info("=" * 50)
     logger.info("✅ Бот успешно запущен и готов к работе!")
     logger.info("=" * 50)
@@ -130,16 +213,28 @@ async def main() -> None:
         # Запускаем polling (long-polling)
         await dp.start_polling(
             bot,
-            allowed_updates=dp.resolve_used_update_types()
+            polling_timeout=POLLING_TIMEOUT,
+            allowed_updates=ALLOWED_UPDATES
         )
     except Exception as e:
-        logger.exception(f"❌ Критическая ошибка: {e}")
+        logger.exception("❌ Критическая ошибка: %s", e)
     finally:
         logger.info("👋 Бот остановлен")
+        shutdown_pools()
+        await stop_pandoc_server()
         await bot.session.close()
+        # Закрываем соединение с Redis (для памяти - ничего не делает)
+        await dp.storage.close()
 
 
 if __name__ == "__main__":
+    # Используем uvloop, если он установлен (на Windows недоступен)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     # Запускаем асинхронный цикл
     try:
         asyncio.run(main())
@@ -4,20 +4,22 @@ FileConverter Bot - Обработчики callback-кнопок
 """
 
 import os
-import tempfile
+import asyncio
 import logging
-from pathlib import Path
+import weakref
 
 from aiogram import Router, F, Bot
-from aiogram.types import CallbackQuery, FSInputFile
+from aiogram.types import CallbackQuery, FSInputFile, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 
-from app.handlers.files import FileState
 from app.utils.converter_logic import (
-    convert_file, 
-    save_file_from_bytes,
+    convert_file,
+    convert_stream,
+    supports_stream,
+    make_temp_path,
     cleanup_files,
-    ConversionError
+    ConversionError,
+    STREAM_CHUNK_SIZE
 )
 from app.keyboards.inline import get_file_type
 
@@ -25,6 +27,68 @@ from app.keyboards.inline import get_file_type
 router = Router(name="callbacks")
 logger = logging.getLogger(__name__)
 
+# Тексты для кнопки отмены
+_CANCEL_TEXT = (
+    "❌ <b>Конвертация отменена</b>\n\n"
+    "<i>Отправьте новый файл, чтобы начать снова.</i>"
+)
+_CANCEL_ANSWER = "Отменено"
+
+# Текст статуса конвертации для каждого типа файла
+STATUS_BY_TYPE = {
+    'video': "🎬 Конвертирую видео... Это может занять некоторое время.",
+    'audio': "🎵 Конвертирую аудио...",
+    'image': "🖼️ Конвертирую изображение...",
+    'document': "📄 Конвертирую документ...",
+    'pdf': "📄 Конвертирую документ...",
+    'text': "📄 Конвертирую документ...",
+    'spreadsheet': "📊 Конвертирую таблицу...",
+}
+DEFAULT_STATUS_TEXT = "⚙️ Конвертирую файл..."
+
+# Типы файлов, которые конвертирует ffmpeg: пустой результат у них - ошибка
+FFMPEG_FILE_TYPES = frozenset({'audio', 'video'})
+
+# Конвертации, которые выполняются прямо сейчас: (user_id, file_id, callback_data).
+# Защищает от двойного нажатия на кнопку формата
+_inflight: set[tuple[int, str, str]] = set()
+
+# Сколько конвертаций одного пользователя выполняются одновременно
+PER_USER_CONVERSIONS = 2
+
+# Сокращать PNG до палитры из 256 цветов (файл меньше, цвета с потерями)
+PNG_QUANTIZE = os.getenv("PNG_QUANTIZE", "0") == "1"
+
+# Максимальный размер большей стороны изображения в пикселях (0 - не уменьшать)
+IMAGE_MAX_DIM = int(os.getenv("IMAGE_MAX_DIM", "0")) or None
+
+# Копировать потоки видео без перекодирования, если контейнер их принимает.
+# 0 - всегда перекодировать (например, для плееров без поддержки кодека)
+VIDEO_STREAM_COPY = os.getenv("VIDEO_STREAM_COPY", "1") == "1"
+
+# Семафоры пользователей. Словарь слабых ссылок: семафор удаляется
+# сам, когда у пользователя не остаётся активных конвертаций
+_user_semaphores: weakref.WeakValueDictionary[int, asyncio.Semaphore] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _get_user_semaphore(user_id: int) -> asyncio.Semaphore:
+    """
+    Возвращает семафор пользователя, создавая его при необходимости
+    
+    Args:
+        user_id: ID пользователя в Telegram
+    
+    Returns:
+        Семафор, ограничивающий конвертации пользователя
+    """
+    semaphore = _user_semaphores.get(user_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PER_USER_CONVERSIONS)
+        _user_semaphores[user_id] = semaphore
+    return semaphore
+
 
 @router.callback_query(F.data == "cancel")
 async def handle_cancel(callback: CallbackQuery, state: FSMContext) -> None:
@@ -33,26 +97,63 @@ async def handle_cancel(callback: CallbackQuery, state: FSMContext) -> None:
     Очищает состояние и удаляет сообщение с кнопками
     """
     await state.clear()
-    await callback.message.edit_text(
-        "❌ <b>Конвертация отменена</b>\n\n"
-        "<i>Отправьте новый файл, чтобы начать снова.</i>",
-        parse_mode="HTML"
-    )
-    await callback.answer("Отменено")
+    await callback.message.edit_text(_CANCEL_TEXT, parse_mode="HTML")
+    await callback.answer(_CANCEL_ANSWER)
 
 
 @router.callback_query(F.data.startswith("cvt:"))
 async def handle_conversion(
     callback: CallbackQuery, 
     bot: Bot,
-    state: FSMContext
+    state: FSMContext,
+    conversion_semaphore: asyncio.Semaphore
 ) -> None:
     """
     Обработчик выбора формата конвертации
-    Скачивает файл, конвертирует и отправляет результат
+    Отсекает повторные нажатия той же кнопки, пока идёт конвертация
     
     Формат callback_data: cvt:{target_format}
     file_id хранится в FSM-состоянии
+    
+    conversion_semaphore передаётся из dp в bot.py: семафор ограничивает
+    число одновременных конвертаций размером пула процессов.
+    """
+    data = await state.get_data()
+    
+    # Ключ: пользователь + файл + выбранный формат (callback_data)
+    key = (callback.from_user.id, data.get("file_id", ""), callback.data)
+    if key in _inflight:
+        await callback.answer("⏳ Уже обрабатывается", show_alert=True)
+        return
+    
+    _inflight.add(key)
+    try:
+        await _process_conversion(
+            callback, bot, state, data, conversion_semaphore,
+            _get_user_semaphore(callback.from_user.id)
+        )
+    finally:
+        _inflight.discard(key)
+
+
+async def _process_conversion(
+    callback: CallbackQuery,
+    bot: Bot,
+    state: FSMContext,
+    data: dict,
+    conversion_semaphore: asyncio.Semaphore,
+    user_semaphore: asyncio.Semaphore
+) -> None:
+    """
+    Скачивает файл, конвертирует и отправляет результат
+    
+    Args:
+        callback: Callback-запрос с выбранным форматом
+        bot: Экземпляр бота
+        state: Контекст FSM
+        data: Данные FSM-состояния (file_id, file_name, file_extension)
+        conversion_semaphore: Ограничитель числа одновременных конвертаций
+        user_semaphore: Ограничитель конвертаций этого пользователя
     """
     await callback.answer("⏳ Начинаю конвертацию...")
     
@@ -68,8 +169,7 @@ async def handle_conversion(
     
     _, target_format = parts
     
-    # Получаем данные из состояния (включая file_id)
-    data = await state.get_data()
+    # Разбираем данные из состояния (включая file_id)
     file_id = data.get("file_id", "")
     file_name = data.get("file_name", "file")
     source_extension = data.get("file_extension", "")
@@ -82,93 +182,113 @@ async def handle_conversion(
         await state.clear()
         return
     
-    # Обновляем сообщение - показываем статус загрузки
+    # Определяем текст статуса по типу файла
+    file_type = get_file_type(source_extension)
+    status_text = STATUS_BY_TYPE.get(file_type, DEFAULT_STATUS_TEXT)
+    
+    # Обновляем сообщение - показываем статус обработки.
+    # Промежуточных правок нет: следующая правка сообщения - итоговая
     status_message = await callback.message.edit_text(
-        "⏳ <b>Обработка файла...</b>\n\n"
-        "📥 Загружаю файл с серверов Telegram...",
+        f"⏳ <b>Обработка файла...</b>\n\n{status_text}",
         parse_mode="HTML"
     )
     
-    # Создаём временные файлы
-    temp_dir = tempfile.gettempdir()
-    input_path = os.path.join(temp_dir, f"input_{callback.from_user.id}_{file_id[:8]}.{source_extension}")
-    output_filename = Path(file_name).stem + f".{target_format}"
-    output_path = os.path.join(temp_dir, f"output_{callback.from_user.id}_{file_id[:8]}.{target_format}")
+    output_filename = (file_name.rpartition('.')[0] or file_name) + f".{target_format}"
+    
+    # Временные файлы создаются только для конвертеров, которым нужен диск
+    input_path = None
+    output_path = None
     
     try:
-        # Скачиваем файл
-        file = await bot.get_file(file_id)
-        file_bytes = await bot.download_file(file.file_path)
-        
-        # Сохраняем во временный файл
-        await save_file_from_bytes(file_bytes.read(), input_path)
-        
-        # Обновляем статус - конвертация
-        file_type = get_file_type(source_extension)
-        if file_type == 'video':
-            status_text = "🎬 Конвертирую видео... Это может занять некоторое время."
-        elif file_type == 'audio':
-            status_text = "🎵 Конвертирую аудио..."
-        elif file_type == 'image':
-            status_text = "🖼️ Конвертирую изображение..."
-        elif file_type in ('document', 'pdf', 'text'):
-            status_text = "📄 Конвертирую документ..."
-        elif file_type == 'spreadsheet':
-            status_text = "📊 Конвертирую таблицу..."
-        else:
-            status_text = "⚙️ Конвертирую файл..."
-        
-        await status_message.edit_text(
-            f"⏳ <b>Обработка файла...</b>\n\n{status_text}",
-            parse_mode="HTML"
-        )
-        
-        # Конвертируем файл
-        await convert_file(
-            input_path=input_path,
-            output_path=output_path,
-            source_format=source_extension,
-            target_format=target_format
-        )
-        
-        # Проверяем, что выходной файл создан
-        if not os.path.exists(output_path):
-            raise ConversionError("Выходной файл не был создан")
-        
-        # Обновляем статус - отправка
-        await status_message.edit_text(
-            "⏳ <b>Обработка файла...</b>\n\n"
-            "📤 Загружаю результат...",
-            parse_mode="HTML"
-        )
-        
-        # Отправляем результат
-        result_file = FSInputFile(output_path, filename=output_filename)
-        
-        await callback.message.answer_document(
-            document=result_file,
-            caption=(
-                f"✅ <b>Конвертация завершена!</b>\n\n"
-                f"📁 <code>{file_name}</code> → <code>{output_filename}</code>"
-            ),
-            parse_mode="HTML"
-        )
-        
-        # Обновляем статусное сообщение
-        await status_message.edit_text(
-            "✅ <b>Готово!</b>\n\n"
-            f"📁 <code>{file_name}</code> → <code>{output_filename}</code>\n\n"
-            "<i>Отправьте ещё файл для конвертации.</i>",
-            parse_mode="HTML"
-        )
-        
-        logger.info(
-            f"Успешная конвертация: {file_name} ({source_extension}) -> {target_format} "
-            f"для пользователя {callback.from_user.id}"
-        )
-        
+        # Не больше PER_USER_CONVERSIONS конвертаций одного пользователя
+        # одновременно - остальные его файлы ждут в очереди
+        async with user_semaphore:
+            # Скачиваем файл
+            file = await bot.get_file(file_id)
+            file_path = file.file_path
+            in_memory = supports_stream(source_extension)
+            
+            if in_memory:
+                # Изображения и таблицы конвертируются в памяти, без записи на диск
+                file_bytes = await bot.download_file(file_path)
+            else:
+                # ffmpeg/pandoc работают только с файлами - создаём временные файлы
+                user_prefix = f"{callback.from_user.id}_{file_id[:8]}_"
+                input_path = make_temp_path(f"input_{user_prefix}", source_extension)
+                output_path = make_temp_path(f"output_{user_prefix}", target_format)
+                
+                # Скачиваем файл потоком прямо на диск, по одному чанку за раз
+                await bot.download_file(
+                    file_path,
+                    destination=input_path,
+                    chunk_size=STREAM_CHUNK_SIZE
+                )
+            
+            if in_memory:
+                async with conversion_semaphore:
+                    out_buf = await convert_stream(
+                        file_bytes.getvalue(),
+                        source_extension,
+                        target_format,
+                        quantize=PNG_QUANTIZE,
+                        max_dim=IMAGE_MAX_DIM
+                    )
+                result_file = BufferedInputFile(out_buf.getvalue(), filename=output_filename)
+            else:
+                # Конвертер сам выбирает пул: ffmpeg и pandoc ждут в потоках,
+                # работа на CPU идёт в пул процессов
+                async with conversion_semaphore:
+                    await convert_file(
+                        input_path,
+                        output_path,
+                        source_extension,
+                        target_format,
+                        stream_copy=VIDEO_STREAM_COPY
+                    )
+                
+                # Проверяем, что конвертер записал результат. Файл создаётся
+                # заранее в make_temp_path, поэтому для ffmpeg смотрим на размер:
+                # пустой аудио- или видеофайл - всегда ошибка, а документ
+                # или таблица могут быть пустыми законно
+                try:
+                    output_size = os.stat(output_path).st_size
+                except FileNotFoundError:
+                    raise ConversionError("Выходной файл не был создан")
+                if not output_size and file_type in FFMPEG_FILE_TYPES:
+                    raise ConversionError("Выходной файл не был создан")
+                
+                # Отправляется потоком с диска, по одному чанку за раз
+                result_file = FSInputFile(
+                    output_path,
+                    filename=output_filename,
+                    chunk_size=STREAM_CHUNK_SIZE
+                )
+            
+            # Отправляем результат
+            await callback.message.answer_document(
+                document=result_file,
+                caption=(
+                    f"✅ <b>Конвертация завершена!</b>\n\n"
+                    f"📁 <code>{file_name}</code> → <code>{output_filename}</code>"
+                ),
+                parse_mode="HTML"
+            )
+            
+            # Обновляем статусное сообщение
+            await status_message.edit_text(
+                "✅ <b>Готово!</b>\n\n"
+                f"📁 <code>{file_name}</code> → <code>{output_filename}</code>\n\n"
+                "<i>Отправьте ещё файл для конвертации.</i>",
+                parse_mode="HTML"
+            )
+            
+            logger.info(
+                "Успешная конвертация: %s (%s) -> %s для пользователя %d",
+                file_name, source_extension, target_format, callback.from_user.id
+            )
+            
     except ConversionError as e:
-        logger.error(f"Ошибка конвертации: {e}")
+        logger.error("Ошибка конвертации: %s", e)
         await status_message.edit_text(
             f"❌ <b>Ошибка конвертации</b>\n\n"
             f"<i>{str(e)}</i>\n\n"
@@ -177,7 +297,7 @@ async def handle_conversion(
         )
     
     except Exception as e:
-        logger.exception(f"Неожиданная ошибка при конвертации: {e}")
+        logger.exception("Неожиданная ошибка при конвертации: %s", e)
         await status_message.edit_text(
             "❌ <b>Произошла непредвиденная ошибка</b>\n\n"
             "Пожалуйста, попробуйте позже или отправьте другой файл.",
@@ -187,7 +307,7 @@ async def handle_conversion(
     finally:
         # Очищаем состояние и временные файлы
         await state.clear()
-        await cleanup_files(input_path, output_path)
+        await cleanup_files(*filter(None, (input_path, output_path)))
 
 
 @router.callback_query()
@@ -199,4 +319,4 @@ async def handle_unknown_callback(callback: CallbackQuery) -> None:
         "⚠️ Эта кнопка устарела. Отправьте файл заново.",
         show_alert=True
     )
-    logger.warning(f"Неизвестный callback: {callback.data}")
+    logger.warning("Неизвестный callback: %s", callback.data)
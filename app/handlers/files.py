@@ -4,18 +4,17 @@ FileConverter Bot - Обработчики входящих файлов
 
 import os
 import logging
-from pathlib import Path
 
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, Document, PhotoSize, Audio, Video, Voice, VideoNote
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from app.keyboards.inline import (
     create_format_keyboard, 
-    get_file_type,
-    get_supported_extensions,
-    get_conversion_info
+    get_conversion_info,
+    SUPPORTED_EXTENSIONS,
+    SUPPORTED_EXTENSIONS_DISPLAY
 )
 
 # Создаём роутер для обработки файлов
@@ -62,16 +61,16 @@ async def process_file(
         return
     
     # Получаем расширение файла
-    extension = Path(file_name).suffix.lower().lstrip('.') if file_name else ''
+    stem, _, ext = (file_name or '').rpartition('.')
+    extension = ext.lower() if stem else ''
     
     # Проверяем поддержку формата
-    if not extension or extension not in get_supported_extensions():
-        supported = ", ".join(sorted(set(get_supported_extensions())))
+    if not extension or extension not in SUPPORTED_EXTENSIONS:
         await message.answer(
             f"❌ <b>Неподдерживаемый формат файла!</b>\n\n"
             f"📁 Ваш файл: <code>{file_name or 'без имени'}</code>\n\n"
             f"<b>Поддерживаемые форматы:</b>\n"
-            f"<code>{supported}</code>\n\n"
+            f"<code>{SUPPORTED_EXTENSIONS_DISPLAY}</code>\n\n"
             f"<i>Отправьте файл в одном из поддерживаемых форматов.</i>",
             parse_mode="HTML"
         )
@@ -88,7 +87,7 @@ async def process_file(
         return
     
     # Создаём клавиатуру с форматами
-    keyboard = create_format_keyboard(extension, file_id)
+    keyboard = create_format_keyboard(extension)
     if not keyboard:
         await message.answer(
             "❌ Произошла ошибка при создании меню конвертации. Попробуйте ещё раз.",
@@ -117,7 +116,10 @@ async def process_file(
         parse_mode="HTML"
     )
     
-    logger.info(f"Получен файл: {file_name} ({file_size} байт), расширение: {extension}")
+    logger.info(
+        "Получен файл: %s (%d байт), расширение: %s",
+        file_name, file_size, extension
+    )
 
 
 @router.message(F.document)
@@ -3,6 +3,9 @@ FileConverter Bot - Инлайн-клавиатуры
 Модуль для генерации клавиатур с форматами конвертации
 """
 
+from functools import lru_cache
+from types import MappingProxyType
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -24,6 +27,15 @@ FILE_TYPE_MAP = {
     'mp4': 'video', 'avi': 'video', 'mov': 'video', 'mkv': 'video',
 }
 
+# Множество поддерживаемых расширений для проверки за O(1)
+SUPPORTED_EXTENSIONS: frozenset[str] = frozenset(FILE_TYPE_MAP)
+
+# Отсортированные расширения для вывода пользователю
+SUPPORTED_EXTENSIONS_SORTED: tuple[str, ...] = tuple(sorted(SUPPORTED_EXTENSIONS))
+
+# Готовая строка со списком форматов для сообщения об ошибке
+SUPPORTED_EXTENSIONS_DISPLAY: str = ", ".join(SUPPORTED_EXTENSIONS_SORTED)
+
 # Доступные форматы конвертации для каждого типа
 CONVERSION_OPTIONS = {
     'image': {
@@ -78,6 +90,51 @@ CONVERSION_OPTIONS = {
     }
 }
 
+# Форматы, которые не предлагаются для каждого расширения: сам исходный формат,
+# а для jpg/jpeg - оба (это алиасы одного формата)
+_EXCLUDES: dict[str, frozenset[str]] = {
+    ext: frozenset({'jpg', 'jpeg'}) if ext in ('jpg', 'jpeg') else frozenset({ext})
+    for ext in FILE_TYPE_MAP
+}
+
+
+def _build_conversion_info(ext: str, file_type: str) -> MappingProxyType:
+    """
+    Строит информацию о конвертациях для расширения
+    Вызывается один раз на каждое расширение при импорте модуля
+    
+    Args:
+        ext: Расширение файла (без точки, в нижнем регистре)
+        file_type: Тип файла из FILE_TYPE_MAP
+    
+    Returns:
+        Неизменяемый словарь с информацией о конвертациях
+    """
+    options = CONVERSION_OPTIONS[file_type]
+    
+    exclude_formats = _EXCLUDES[ext]
+    available = tuple(fmt for fmt in options['formats'] if fmt not in exclude_formats)
+    
+    return MappingProxyType({
+        'type': file_type,
+        'emoji': options['emoji'],
+        'available_formats': available,
+        'format_names': MappingProxyType(
+            {fmt: options['names'].get(fmt, fmt.upper()) for fmt in available}
+        )
+    })
+
+
+# Кнопка отмены, общая для всех клавиатур
+CANCEL_BUTTON = InlineKeyboardButton(text="❌ Отмена", callback_data="cancel")
+
+# Предвычисленная информация о конвертациях для каждого расширения
+PER_EXT_INFO: dict[str, MappingProxyType] = {
+    ext: _build_conversion_info(ext, file_type)
+    for ext, file_type in FILE_TYPE_MAP.items()
+    if file_type in CONVERSION_OPTIONS
+}
+
 
 def get_file_type(extension: str) -> str | None:
     """
@@ -92,69 +149,64 @@ def get_file_type(extension: str) -> str | None:
     return FILE_TYPE_MAP.get(extension.lower())
 
 
-def get_supported_extensions() -> list[str]:
+def get_supported_extensions() -> frozenset[str]:
     """
-    Возвращает список всех поддерживаемых расширений
+    Возвращает множество всех поддерживаемых расширений
     
     Returns:
-        Список поддерживаемых расширений
+        Неизменяемое множество поддерживаемых расширений
     """
-    return list(FILE_TYPE_MAP.keys())
+    return SUPPORTED_EXTENSIONS
 
 
-def create_format_keyboard(
-    file_extension: str, 
-    file_id: str
-) -> InlineKeyboardMarkup | None:
+def create_format_keyboard(file_extension: str) -> InlineKeyboardMarkup | None:
     """
     Создаёт инлайн-клавиатуру с доступными форматами для конвертации
     
     Args:
         file_extension: Расширение исходного файла
-        file_id: ID файла в Telegram для callback_data
     
     Returns:
         Инлайн-клавиатура или None если формат не поддерживается
     """
-    ext = file_extension.lower().lstrip('.')
-    file_type = get_file_type(ext)
+    return _build_markup(file_extension.lower().lstrip('.'))
+
+
+@lru_cache(maxsize=64)
+def _build_markup(ext: str) -> InlineKeyboardMarkup | None:
+    """
+    Строит клавиатуру для расширения и кэширует её
+    Клавиатура зависит только от расширения (file_id хранится в FSM),
+    поэтому один экземпляр разделяется между всеми сообщениями
+    
+    Args:
+        ext: Расширение файла (без точки, в нижнем регистре)
+    
+    Returns:
+        Инлайн-клавиатура или None если формат не поддерживается
+    """
+    info = PER_EXT_INFO.get(ext)
     
-    if not file_type or file_type not in CONVERSION_OPTIONS:
+    if info is None:
         return None
     
-    options = CONVERSION_OPTIONS[file_type]
     builder = InlineKeyboardBuilder()
     
-    # Получаем доступные форматы (исключаем исходный)
-    # Также исключаем jpeg если исходный jpg (и наоборот) - это алиасы
-    exclude_formats = {ext}
-    if ext in ('jpg', 'jpeg'):
-        exclude_formats = {'jpg', 'jpeg'}
-    
-    available_formats = [
-        fmt for fmt in options['formats'] 
-        if fmt not in exclude_formats
-    ]
-    
-    # Создаём кнопки для каждого формата
-    for target_format in available_formats:
-        emoji = options['emoji']
-        name = options['names'].get(target_format, target_format.upper())
+    # Создаём кнопки для каждого доступного формата (исходный уже исключён)
+    for target_format in info['available_formats']:
+        name = info['format_names'][target_format]
         
         # callback_data формат: cvt:{target_format}
         # file_id хранится в FSM-состоянии
         callback_data = f"cvt:{target_format}"
         
         builder.add(InlineKeyboardButton(
-            text=f"{emoji} {name}",
+            text=f"{info['emoji']} {name}",
             callback_data=callback_data
         ))
     
     # Добавляем кнопку отмены
-    builder.add(InlineKeyboardButton(
-        text="❌ Отмена",
-        callback_data="cancel"
-    ))
+    builder.add(CANCEL_BUTTON)
     
     # Располагаем кнопки по 2 в ряд, кнопку отмены - отдельно
     builder.adjust(2, 2, 2, 1)
@@ -162,7 +214,7 @@ def create_format_keyboard(
     return builder.as_markup()
 
 
-def get_conversion_info(file_extension: str) -> dict | None:
+def get_conversion_info(file_extension: str) -> MappingProxyType | None:
     """
     Получает информацию о возможных конвертациях для файла
     
@@ -170,20 +222,6 @@ def get_conversion_info(file_extension: str) -> dict | None:
         file_extension: Расширение файла
     
     Returns:
-        Словарь с информацией или None если не поддерживается
+        Неизменяемый словарь с информацией или None если не поддерживается
     """
-    ext = file_extension.lower().lstrip('.')
-    file_type = get_file_type(ext)
-    
-    if not file_type or file_type not in CONVERSION_OPTIONS:
-        return None
-    
-    options = CONVERSION_OPTIONS[file_type]
-    available = [fmt for fmt in options['formats'] if fmt != ext]
-    
-    return {
-        'type': file_type,
-        'emoji': options['emoji'],
-        'available_formats': available,
-        'format_names': {fmt: options['names'].get(fmt, fmt.upper()) for fmt in available}
-    }
+    return PER_EXT_INFO.get(file_extension.lower().lstrip('.'))
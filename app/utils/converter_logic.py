@@ -5,53 +5,373 @@ FileConverter Bot - Логика конвертации файлов
 
 import os
 import io
+import base64
 import asyncio
+import tempfile
+import socket
 import logging
+import subprocess
+from functools import cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from types import MappingProxyType
 from typing import BinaryIO
 
 import aiofiles
+import aiohttp
 from PIL import Image
 import pillow_heif
+import av
+from av.codec.codec import UnknownCodecError
 import ffmpeg
-from pydub import AudioSegment
 import pypandoc
 import pandas as pd
+from openpyxl import Workbook
+import pyarrow.csv as pa_csv
+from charset_normalizer import from_bytes
 
 # Регистрируем поддержку HEIC
 pillow_heif.register_heif_opener()
 
 logger = logging.getLogger(__name__)
 
+# Типы файлов, конвертеры которых умеют работать с потоками в памяти.
+# Остальным (ffmpeg, pandoc) нужен файл на диске.
+STREAM_FILE_TYPES = frozenset({'image', 'spreadsheet'})
+
+# Маппинг расширений к форматам Pillow
+IMAGE_FORMAT_MAP = MappingProxyType({
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'png': 'PNG',
+    'webp': 'WEBP',
+    'bmp': 'BMP',
+    'pdf': 'PDF',
+})
+
+# Форматы без прозрачности: альфа-канал накладывается на белый фон
+FLAT_IMAGE_FORMATS = frozenset({'JPEG', 'BMP', 'PDF'})
+
+# Режимы, которые PNG и WEBP сохраняют без преобразования
+NATIVE_IMAGE_MODES = MappingProxyType({
+    'PNG': frozenset({'1', 'L', 'LA', 'P', 'RGB', 'RGBA'}),
+    'WEBP': frozenset({'L', 'LA', 'RGB', 'RGBA'}),
+})
+
+# Параметры сохранения изображений по форматам Pillow
+IMAGE_SAVE_KWARGS = MappingProxyType({
+    'JPEG': MappingProxyType({
+        'quality': 82, 'optimize': True, 'progressive': True, 'subsampling': '4:2:0'
+    }),
+    'PNG': MappingProxyType({'optimize': True, 'compress_level': 9}),
+    'WEBP': MappingProxyType({'quality': 82, 'method': 6}),
+})
+
+# Маппинг расширений к форматам Pandoc
+PANDOC_FORMAT_MAP = MappingProxyType({
+    'docx': 'docx',
+    'doc': 'doc',
+    'pdf': 'pdf',
+    'txt': 'plain',
+    'rtf': 'rtf',
+    'odt': 'odt',
+})
+
+# Размер чанка и буфера при потоковой записи и чтении файлов
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Сколько байт CSV читать для определения кодировки
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# Кодировки CSV, из которых выбирается, если файл не в UTF-8.
+# Без ограничения короткие файлы распознаются как big5, cp949 и т.п.
+CSV_FALLBACK_ENCODINGS = ('cp1251', 'latin_1')
+
+# Форматы чтения Pandoc. 'plain' у Pandoc есть только для записи,
+# поэтому txt читается как markdown. Для doc и pdf чтения в Pandoc
+# нет - такие файлы на pandoc server не отправляются
+PANDOC_READER_MAP = MappingProxyType({
+    'docx': 'docx',
+    'txt': 'markdown',
+    'rtf': 'rtf',
+    'odt': 'odt',
+})
+
+# Бинарные форматы Pandoc: в JSON API pandoc server передаются в base64
+PANDOC_BINARY_FORMATS = frozenset({'docx', 'odt'})
+
+# Параметры кодирования аудио для разных форматов
+AUDIO_CODEC_SETTINGS = MappingProxyType({
+    'mp3': MappingProxyType({'acodec': 'libmp3lame', 'audio_bitrate': '320k'}),
+    'ogg': MappingProxyType({'acodec': 'libvorbis'}),
+    'wav': MappingProxyType({'acodec': 'pcm_s16le'}),
+    'flac': MappingProxyType({'acodec': 'flac'}),
+})
+
+# Программные кодеки для видео.
+# +faststart переносит индекс в начало mp4, чтобы видео играло сразу
+VIDEO_CODEC_SETTINGS = MappingProxyType({
+    'mp4': MappingProxyType({'vcodec': 'libx264', 'acodec': 'aac', 'movflags': '+faststart'}),
+    'avi': MappingProxyType({'vcodec': 'mpeg4', 'acodec': 'mp3'}),
+    'mkv': MappingProxyType({'vcodec': 'libx264', 'acodec': 'aac'}),
+})
+
+# Аппаратные кодеки NVIDIA (NVENC), используются при наличии GPU.
+# Для avi аппаратного кодека нет - остаётся программный mpeg4
+NVENC_VIDEO_CODEC_SETTINGS = MappingProxyType({
+    'mp4': MappingProxyType({
+        'vcodec': 'h264_nvenc', 'acodec': 'aac', 'preset': 'p4', 'tune': 'hq',
+        'movflags': '+faststart'
+    }),
+    'mkv': MappingProxyType({
+        'vcodec': 'hevc_nvenc', 'acodec': 'aac', 'preset': 'p4', 'tune': 'hq'
+    }),
+})
+
+# Для неизвестного формата потоки копируются без перекодирования
+COPY_CODEC_SETTINGS = MappingProxyType({'vcodec': 'copy', 'acodec': 'copy'})
+
+# Кодеки, которые контейнер принимает как есть: если все потоки видео
+# из этого набора, они копируются без перекодирования (ffmpeg -c copy)
+STREAM_COPY_CODECS = MappingProxyType({
+    'mp4': frozenset({'h264', 'hevc', 'aac', 'mp3'}),
+    'mkv': frozenset({'h264', 'hevc', 'vp9', 'av1', 'aac', 'mp3', 'opus', 'vorbis', 'flac'}),
+})
+
+# Параметры копирования потоков. Субтитры отбрасываются:
+# их формат часто несовместим с целевым контейнером
+STREAM_COPY_SETTINGS = MappingProxyType({
+    'mp4': MappingProxyType({
+        'vcodec': 'copy', 'acodec': 'copy', 'sn': None, 'movflags': '+faststart'
+    }),
+    'mkv': MappingProxyType({'vcodec': 'copy', 'acodec': 'copy', 'sn': None}),
+})
+
+# Параметры входа при кодировании через NVENC: декодирование тоже на GPU
+NVENC_INPUT_KWARGS = MappingProxyType({'hwaccel': 'cuda', 'hwaccel_output_format': 'cuda'})
+
+# Пустые параметры по умолчанию
+_NO_KWARGS = MappingProxyType({})
 
 class ConversionError(Exception):
     """Исключение при ошибке конвертации"""
     pass
 
 
-async def run_in_executor(func, *args, **kwargs):
+@cache
+def _has_nvenc() -> bool:
+    """
+    Проверяет, может ли ffmpeg кодировать видео через NVENC
+    Кодирует пустой кадр: наличия h264_nvenc в списке кодеков мало,
+    он бывает собран и на машинах без GPU. Проверка выполняется
+    один раз, при первой конвертации видео, а не при импорте модуля
+    
+    Returns:
+        True если аппаратное кодирование доступно
+    """
+    try:
+        result = subprocess.run(
+            [
+                'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                '-f', 'lavfi', '-i', 'nullsrc=s=256x256:d=0.1',
+                '-c:v', 'h264_nvenc', '-f', 'null', '-'
+            ],
+            capture_output=True,
+            timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    
+    return result.returncode == 0
+
+
+# Постоянный процесс pandoc server и HTTP-сессия для запросов к нему.
+# Заполняются в start_pandoc_server при запуске бота
+_pandoc_server: asyncio.subprocess.Process | None = None
+_pandoc_session: aiohttp.ClientSession | None = None
+_pandoc_server_url: str | None = None
+
+
+# Число процессов для конвертации на CPU
+CPU_WORKERS = os.cpu_count() or 1
+
+# Пул процессов для работы на CPU (Pillow, pandas): конвертации
+# выполняются параллельно на всех ядрах, без общего GIL.
+# Executor по умолчанию остаётся пулом потоков - он нужен aiofiles,
+# asyncio.to_thread и aiogram, которые передают в него несериализуемые объекты.
+# Создаётся при первой конвертации, а не при импорте модуля
+_cpu_pool: ProcessPoolExecutor | None = None
+
+# Пул потоков для конвертеров, которые ждут внешний процесс (ffmpeg, pandoc)
+_io_pool: ThreadPoolExecutor | None = None
+
+
+def _get_executor(func) -> ProcessPoolExecutor | ThreadPoolExecutor:
     """
-    Запускает синхронную функцию в отдельном потоке
+    Возвращает пул для функции, создавая его при первом обращении
     
     Args:
-        func: Функция для выполнения
+        func: Функция верхнего уровня модуля
+    
+    Returns:
+        _io_pool для конвертеров из _IO_BOUND_FUNCS, иначе _cpu_pool
+    """
+    global _cpu_pool, _io_pool
+    
+    if func in _IO_BOUND_FUNCS:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(thread_name_prefix='convert-io')
+        return _io_pool
+    
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _cpu_pool
+
+
+def _discard_cpu_pool(executor: ProcessPoolExecutor) -> None:
+    """
+    Отбрасывает сломанный пул процессов: следующая задача создаст новый
+    Пул сбрасывается, только если его ещё не заменила другая задача
+    
+    Args:
+        executor: Пул, в котором упал процесс
+    """
+    global _cpu_pool
+    
+    if _cpu_pool is executor:
+        executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+
+
+async def run_in_executor(func, *args):
+    """
+    Запускает синхронную функцию вне event loop
+    Конвертеры из _IO_BOUND_FUNCS выполняются в пуле потоков, остальные -
+    в пуле процессов. Функция передаётся в пул как есть, без lambda
+    и замыканий: функция верхнего уровня и позиционные аргументы
+    сериализуются через pickle для пула процессов
+    
+    Args:
+        func: Функция верхнего уровня модуля
         *args: Позиционные аргументы
-        **kwargs: Именованные аргументы
     
     Returns:
         Результат выполнения функции
+    
+    Raises:
+        ConversionError: Если процесс пула аварийно завершился и при повторе
     """
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None, 
-        lambda: func(*args, **kwargs)
-    )
+    loop = asyncio.get_running_loop()
+    executor = _get_executor(func)
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # Процесс пула упал (например, убит OOM) - такой пул больше
+        # не принимает задачи. Пересоздаём его и повторяем один раз
+        logger.warning("Пул процессов сломан, создаём новый")
+        _discard_cpu_pool(executor)
+    
+    executor = _get_executor(func)
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        _discard_cpu_pool(executor)
+        raise ConversionError("Процесс конвертации аварийно завершился")
+
+
+def shutdown_pools() -> None:
+    """
+    Останавливает пулы конвертации, отменяя задачи из очереди
+    """
+    global _cpu_pool, _io_pool
+    
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
+
+
+def _convert_image_sync(
+    source: str | BinaryIO,
+    destination: str | BinaryIO,
+    target_format: str,
+    quantize: bool = False,
+    max_dim: int | None = None
+) -> None:
+    """
+    Синхронная конвертация изображения через Pillow
+    Работает как с путями к файлам, так и с файловыми объектами в памяти
+    
+    Args:
+        source: Путь к исходному файлу или файловый объект
+        destination: Путь для сохранения результата или файловый объект
+        target_format: Целевой формат (jpg, png, webp, bmp, pdf)
+        quantize: Сократить PNG до палитры из 256 цветов
+        max_dim: Максимальный размер большей стороны (None - без уменьшения)
+    
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    try:
+        with Image.open(source) as img:
+            if max_dim and max(img.size) > max_dim:
+                # JPEG libjpeg уменьшает в 2, 4 или 8 раз прямо при
+                # декодировании, без полного разбора всех пикселей
+                if img.format == 'JPEG':
+                    img.draft('RGB', (max_dim, max_dim))
+                img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+            
+            pil_format = IMAGE_FORMAT_MAP.get(target_format.lower(), target_format.upper())
+            
+            # Премультиплицированную альфу (RGBa, La) переводим в обычную:
+            # её каналы в нижнем регистре, и проверки на 'A' ниже их не видят
+            if img.mode in ('RGBa', 'La'):
+                img = img.convert(img.mode.upper())
+            
+            if pil_format in FLAT_IMAGE_FORMATS:
+                # Палитру расширяем до RGBA только при наличии прозрачности
+                if img.mode == 'P':
+                    img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+                
+                if 'A' in img.getbands():
+                    # Создаём белый фон для прозрачности (RGBA, LA, PA).
+                    # Маска - один альфа-канал, остальные каналы не копируются
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel('A'))
+                    img = background
+                elif img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+            elif pil_format in NATIVE_IMAGE_MODES and img.mode not in NATIVE_IMAGE_MODES[pil_format]:
+                # Оттенки серого и прозрачность PNG и WEBP хранят как есть,
+                # остальные режимы (CMYK, палитра для WEBP) приводим к RGB/RGBA
+                has_alpha = 'transparency' in img.info or 'A' in img.getbands()
+                img = img.convert('RGBA' if has_alpha else 'RGB')
+            
+            # Квантуем PNG до палитры из 256 цветов, если об этом попросили
+            if quantize and pil_format == 'PNG' and img.mode in ('RGB', 'RGBA'):
+                try:
+                    img = img.quantize(colors=256, method=Image.Quantize.LIBIMAGEQUANT)
+                except ValueError:
+                    # Pillow собран без libimagequant
+                    img = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            
+            save_kwargs = IMAGE_SAVE_KWARGS.get(pil_format, _NO_KWARGS)
+            img.save(destination, format=pil_format, **save_kwargs)
+    
+    except Exception as e:
+        logger.error(f"Ошибка конвертации изображения: {e}")
+        raise ConversionError(f"Не удалось конвертировать изображение: {e}")
 
 
 async def convert_image(
     input_path: str, 
     output_path: str, 
-    target_format: str
+    target_format: str,
+    quantize: bool = False,
+    max_dim: int | None = None
 ) -> str:
     """
     Конвертирует изображение в указанный формат
@@ -60,59 +380,173 @@ async def convert_image(
         input_path: Путь к исходному файлу
         output_path: Путь для сохранения результата
         target_format: Целевой формат (jpg, png, webp, bmp, pdf)
+        quantize: Сократить PNG до палитры из 256 цветов
+        max_dim: Максимальный размер большей стороны (None - без уменьшения)
     
     Returns:
         Путь к сконвертированному файлу
     
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    await run_in_executor(
+        _convert_image_sync, input_path, output_path, target_format, quantize, max_dim
+    )
+    logger.info(f"Изображение сконвертировано: {input_path} -> {output_path}")
+    return output_path
+
+
+def _supported_sample_rate(rate: int, supported: tuple[int, ...] | None) -> int:
+    """
+    Выбирает частоту дискретизации, которую поддерживает кодек
+    
+    Args:
+        rate: Частота исходного аудио
+        supported: Частоты кодека (None - любая)
+    
+    Returns:
+        Исходная частота, если кодек её принимает, иначе ближайшая
+        поддерживаемая не выше исходной (или минимальная)
+    """
+    if not supported or rate in supported:
+        return rate
+    
+    lower = [r for r in supported if r <= rate]
+    return max(lower) if lower else min(supported)
+
+
+def _transcode_av(
+    input_path: str,
+    output_path: str,
+    settings: MappingProxyType
+) -> None:
+    """
+    Перекодирует файл внутри процесса через PyAV (libav*), без запуска ffmpeg
+    Пакеты обрабатываются по одному, память не зависит от размера файла
+    
+    Args:
+        input_path: Путь к исходному файлу
+        output_path: Путь для сохранения результата
+        settings: Параметры кодирования в формате ffmpeg-python
+            (vcodec, acodec, audio_bitrate, movflags, preset, tune)
+    
+    Raises:
+        UnknownCodecError: Если кодека нет в сборке libav, с которой собран PyAV
+        av.FFmpegError: При ошибке декодирования или кодирования
+    """
+    vcodec = settings.get('vcodec')
+    acodec = settings.get('acodec')
+    container_options = {k: settings[k] for k in ('movflags',) if k in settings}
+    codec_options = {k: settings[k] for k in ('preset', 'tune') if k in settings}
+    
+    with av.open(input_path) as src, \
+            av.open(output_path, 'w', options=container_options) as dst:
+        # Входной поток -> (выходной поток, ресемплер для аудио)
+        streams = {}
+        
+        if vcodec and src.streams.video:
+            in_video = src.streams.video[0]
+            in_video.thread_type = 'AUTO'
+            out_video = dst.add_stream(
+                vcodec,
+                rate=in_video.average_rate or 25,
+                options=codec_options
+            )
+            out_video.width = in_video.codec_context.width
+            out_video.height = in_video.codec_context.height
+            out_video.pix_fmt = 'yuv420p'
+            streams[in_video] = (out_video, None)
+        
+        if acodec and src.streams.audio:
+            in_audio = src.streams.audio[0]
+            
+            # Частота, которую принимает кодек (MP3 - не выше 48 кГц)
+            rate = _supported_sample_rate(
+                in_audio.rate,
+                av.codec.Codec(acodec, 'w').audio_rates
+            )
+            out_audio = dst.add_stream(acodec, rate=rate)
+            if bitrate := settings.get('audio_bitrate'):
+                out_audio.bit_rate = int(bitrate.rstrip('k')) * 1000
+            
+            # MP3 хранит не больше двух каналов
+            layout = in_audio.layout.name
+            if acodec in ('mp3', 'libmp3lame') and in_audio.channels > 2:
+                layout = 'stereo'
+            
+            # Приводим отсчёты к формату, который принимает кодек
+            resampler = av.AudioResampler(
+                format=out_audio.codec_context.codec.audio_formats[0].name,
+                layout=layout,
+                rate=rate
+            )
+            streams[in_audio] = (out_audio, resampler)
+        
+        if not streams:
+            raise ConversionError("В файле нет потоков для конвертации")
+        
+        for packet in src.demux(*streams):
+            out_stream, resampler = streams[packet.stream]
+            for frame in packet.decode():
+                frames = resampler.resample(frame) if resampler else (frame,)
+                for out_frame in frames:
+                    dst.mux(out_stream.encode(out_frame))
+        
+        # Сбрасываем буферы ресемплеров и кодеков
+        for out_stream, resampler in streams.values():
+            if resampler:
+                for out_frame in resampler.resample(None):
+                    dst.mux(out_stream.encode(out_frame))
+            dst.mux(out_stream.encode(None))
+
+
+def _convert_audio_sync(
+    input_path: str,
+    output_path: str,
+    target_format: str
+) -> None:
+    """
+    Синхронная конвертация аудио через ffmpeg
+    Декодирование и кодирование целиком внутри ffmpeg, без PCM-буфера в Python
+    
+    Args:
+        input_path: Путь к исходному файлу
+        output_path: Путь для сохранения результата
+        target_format: Целевой формат (mp3, ogg, wav, flac)
+    
     Raises:
         ConversionError: При ошибке конвертации
     """
     try:
-        def _convert():
-            with Image.open(input_path) as img:
-                # Конвертируем в RGB если нужно (для JPEG и PDF)
-                if target_format.lower() in ('jpg', 'jpeg', 'pdf'):
-                    if img.mode in ('RGBA', 'P', 'LA'):
-                        # Создаём белый фон для прозрачности
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                        img = background
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                
-                # Маппинг форматов для Pillow
-                format_map = {
-                    'jpg': 'JPEG',
-                    'jpeg': 'JPEG',
-                    'png': 'PNG',
-                    'webp': 'WEBP',
-                    'bmp': 'BMP',
-                    'pdf': 'PDF'
-                }
-                
-                pil_format = format_map.get(target_format.lower(), target_format.upper())
-                
-                # Сохраняем с оптимальным качеством
-                save_kwargs = {}
-                if pil_format == 'JPEG':
-                    save_kwargs = {'quality': 95, 'optimize': True}
-                elif pil_format == 'PNG':
-                    save_kwargs = {'optimize': True}
-                elif pil_format == 'WEBP':
-                    save_kwargs = {'quality': 90}
-                
-                img.save(output_path, format=pil_format, **save_kwargs)
-                return output_path
+        settings = AUDIO_CODEC_SETTINGS.get(target_format, _NO_KWARGS)
         
-        result = await run_in_executor(_convert)
-        logger.info(f"Изображение сконвертировано: {input_path} -> {output_path}")
-        return result
+        try:
+            _transcode_av(input_path, output_path, settings)
+            return
+        except UnknownCodecError as e:
+            # В сборке libav у PyAV нет кодека (например, libvorbis)
+            logger.info(f"PyAV: {e}, конвертируем через ffmpeg")
         
+        # Запускаем конвертацию через ffmpeg
+        stream = ffmpeg.input(input_path)
+        stream = ffmpeg.output(stream, output_path, **settings)
+        
+        ffmpeg.run(
+            stream,
+            capture_stdout=True,
+            capture_stderr=True,
+            overwrite_output=True
+        )
+    
+    except ffmpeg.Error as e:
+        logger.error(f"Ошибка ffmpeg: {e.stderr.decode() if e.stderr else str(e)}")
+        raise ConversionError("Не удалось конвертировать аудио: ошибка ffmpeg")
+    except av.FFmpegError as e:
+        logger.error(f"Ошибка PyAV: {e}")
+        raise ConversionError("Не удалось конвертировать аудио: ошибка декодирования")
     except Exception as e:
-        logger.error(f"Ошибка конвертации изображения: {e}")
-        raise ConversionError(f"Не удалось конвертировать изображение: {e}")
+        logger.error(f"Ошибка конвертации аудио: {e}")
+        raise ConversionError(f"Не удалось конвертировать аудио: {e}")
 
 
 async def convert_audio(
@@ -131,46 +565,129 @@ async def convert_audio(
     Returns:
         Путь к сконвертированному файлу
     
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    await run_in_executor(_convert_audio_sync, input_path, output_path, target_format)
+    logger.info(f"Аудио сконвертировано: {input_path} -> {output_path}")
+    return output_path
+
+
+def _video_settings(target_format: str) -> tuple[MappingProxyType, MappingProxyType]:
+    """
+    Подбирает параметры ffmpeg для видео
+    
+    Args:
+        target_format: Целевой формат (mp4, avi, mkv)
+    
+    Returns:
+        Параметры входа и параметры кодирования выхода
+    """
+    # Аппаратный кодек, если он есть для формата, иначе программный
+    settings = None
+    if _has_nvenc():
+        settings = NVENC_VIDEO_CODEC_SETTINGS.get(target_format)
+    if settings is None:
+        settings = VIDEO_CODEC_SETTINGS.get(target_format, COPY_CODEC_SETTINGS)
+    
+    # При кодировании через NVENC декодируем тоже на GPU,
+    # кадры не копируются в системную память
+    if settings['vcodec'].endswith('_nvenc'):
+        return NVENC_INPUT_KWARGS, settings
+    
+    return _NO_KWARGS, settings
+
+
+def _can_stream_copy(input_path: str, target_format: str) -> bool:
+    """
+    Проверяет, можно ли перенести видео в контейнер без перекодирования
+    
+    Args:
+        input_path: Путь к исходному файлу
+        target_format: Целевой формат (mp4, mkv)
+    
+    Returns:
+        True если все аудио- и видеопотоки подходят целевому контейнеру
+    """
+    allowed = STREAM_COPY_CODECS.get(target_format)
+    if allowed is None:
+        return False
+    
+    try:
+        with av.open(input_path) as container:
+            codecs = {
+                stream.codec_context.name
+                for stream in container.streams
+                if stream.type in ('video', 'audio')
+            }
+    except av.FFmpegError:
+        return False
+    
+    return bool(codecs) and codecs <= allowed
+
+
+def _convert_video_sync(
+    input_path: str,
+    output_path: str,
+    target_format: str,
+    stream_copy: bool = True
+) -> None:
+    """
+    Синхронная конвертация видео через ffmpeg
+    
+    Args:
+        input_path: Путь к исходному файлу
+        output_path: Путь для сохранения результата
+        target_format: Целевой формат (mp4, avi, mkv)
+        stream_copy: Копировать потоки без перекодирования, если контейнер их принимает
+    
     Raises:
         ConversionError: При ошибке конвертации
     """
     try:
-        def _convert():
-            # Определяем формат входного файла
-            input_ext = Path(input_path).suffix.lower().lstrip('.')
-            
-            # Загружаем аудио
-            audio = AudioSegment.from_file(input_path, format=input_ext)
-            
-            # Параметры экспорта для разных форматов
-            export_kwargs = {}
-            if target_format == 'mp3':
-                export_kwargs = {'format': 'mp3', 'bitrate': '320k'}
-            elif target_format == 'ogg':
-                export_kwargs = {'format': 'ogg', 'codec': 'libvorbis'}
-            elif target_format == 'wav':
-                export_kwargs = {'format': 'wav'}
-            elif target_format == 'flac':
-                export_kwargs = {'format': 'flac'}
-            else:
-                export_kwargs = {'format': target_format}
-            
-            audio.export(output_path, **export_kwargs)
-            return output_path
+        if stream_copy and _can_stream_copy(input_path, target_format):
+            # Меняется только контейнер (например, mkv -> mp4 с h264/aac)
+            input_kwargs, settings = _NO_KWARGS, STREAM_COPY_SETTINGS[target_format]
+        else:
+            input_kwargs, settings = _video_settings(target_format)
+        
+        # Программные кодеки работают внутри процесса через PyAV.
+        # NVENC (с декодированием на GPU) и копирование потоков - через ffmpeg
+        if not input_kwargs and settings['vcodec'] != 'copy':
+            try:
+                _transcode_av(input_path, output_path, settings)
+                return
+            except UnknownCodecError as e:
+                logger.info(f"PyAV: {e}, конвертируем через ffmpeg")
         
-        result = await run_in_executor(_convert)
-        logger.info(f"Аудио сконвертировано: {input_path} -> {output_path}")
-        return result
+        # Запускаем конвертацию через ffmpeg
+        stream = ffmpeg.input(input_path, **input_kwargs)
+        stream = ffmpeg.output(
+            stream, 
+            output_path,
+            threads=0,  # Программные кодеки используют все ядра
+            **settings,
+            **{'y': None}  # Перезаписывать без вопросов
+        )
         
+        ffmpeg.run(stream, capture_stdout=True, capture_stderr=True)
+    
+    except ffmpeg.Error as e:
+        logger.error(f"Ошибка ffmpeg: {e.stderr.decode() if e.stderr else str(e)}")
+        raise ConversionError("Не удалось конвертировать видео: ошибка ffmpeg")
+    except av.FFmpegError as e:
+        logger.error(f"Ошибка PyAV: {e}")
+        raise ConversionError("Не удалось конвертировать видео: ошибка декодирования")
     except Exception as e:
-        logger.error(f"Ошибка конвертации аудио: {e}")
-        raise ConversionError(f"Не удалось конвертировать аудио: {e}")
+        logger.error(f"Ошибка конвертации видео: {e}")
+        raise ConversionError(f"Не удалось конвертировать видео: {e}")
 
 
 async def convert_video(
     input_path: str, 
     output_path: str, 
-    target_format: str
+    target_format: str,
+    stream_copy: bool = True
 ) -> str:
     """
     Конвертирует видеофайл в указанный формат
@@ -179,47 +696,114 @@ async def convert_video(
         input_path: Путь к исходному файлу
         output_path: Путь для сохранения результата
         target_format: Целевой формат (mp4, avi, mkv)
+        stream_copy: Копировать потоки без перекодирования, если контейнер их принимает
     
     Returns:
         Путь к сконвертированному файлу
     
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    await run_in_executor(
+        _convert_video_sync, input_path, output_path, target_format, stream_copy
+    )
+    logger.info(f"Видео сконвертировано: {input_path} -> {output_path}")
+    return output_path
+
+
+def _convert_document_sync(
+    input_path: str,
+    output_path: str,
+    target_format: str
+) -> None:
+    """
+    Синхронная конвертация документа через Pandoc
+    
+    Args:
+        input_path: Путь к исходному файлу
+        output_path: Путь для сохранения результата
+        target_format: Целевой формат (pdf, txt, docx)
+    
     Raises:
         ConversionError: При ошибке конвертации
     """
     try:
-        def _convert():
-            # Настройки кодеков для разных форматов
-            codec_settings = {
-                'mp4': {'vcodec': 'libx264', 'acodec': 'aac'},
-                'avi': {'vcodec': 'mpeg4', 'acodec': 'mp3'},
-                'mkv': {'vcodec': 'libx264', 'acodec': 'aac'},
-            }
-            
-            settings = codec_settings.get(target_format, {'vcodec': 'copy', 'acodec': 'copy'})
-            
-            # Запускаем конвертацию через ffmpeg
-            stream = ffmpeg.input(input_path)
-            stream = ffmpeg.output(
-                stream, 
-                output_path,
-                vcodec=settings['vcodec'],
-                acodec=settings['acodec'],
-                **{'y': None}  # Перезаписывать без вопросов
-            )
-            
-            ffmpeg.run(stream, capture_stdout=True, capture_stderr=True)
-            return output_path
+        input_ext = Path(input_path).suffix.lower().lstrip('.')
+        # Для doc и pdf формат чтения не задаём: Pandoc сам сообщит об ошибке
+        input_format = PANDOC_READER_MAP.get(input_ext)
+        output_format = PANDOC_FORMAT_MAP.get(target_format, target_format)
         
-        result = await run_in_executor(_convert)
-        logger.info(f"Видео сконвертировано: {input_path} -> {output_path}")
-        return result
+        # Для PDF нужен дополнительный параметр
+        extra_args = []
+        if target_format == 'pdf':
+            extra_args = ['--pdf-engine=xelatex']
         
-    except ffmpeg.Error as e:
-        logger.error(f"Ошибка ffmpeg: {e.stderr.decode() if e.stderr else str(e)}")
-        raise ConversionError(f"Не удалось конвертировать видео: ошибка ffmpeg")
+        pypandoc.convert_file(
+            input_path,
+            output_format,
+            format=input_format,
+            outputfile=output_path,
+            extra_args=extra_args
+        )
+    
     except Exception as e:
-        logger.error(f"Ошибка конвертации видео: {e}")
-        raise ConversionError(f"Не удалось конвертировать видео: {e}")
+        logger.error(f"Ошибка конвертации документа: {e}")
+        raise ConversionError(f"Не удалось конвертировать документ: {e}")
+
+
+async def _convert_document_via_server(
+    input_path: str,
+    output_path: str,
+    target_format: str
+) -> None:
+    """
+    Конвертирует документ запросом к постоянному pandoc server
+    
+    Args:
+        input_path: Путь к исходному файлу
+        output_path: Путь для сохранения результата
+        target_format: Целевой формат (txt, docx)
+    
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    try:
+        input_ext = Path(input_path).suffix.lower().lstrip('.')
+        
+        async with aiofiles.open(input_path, 'rb') as f:
+            data = await f.read()
+        
+        if input_ext in PANDOC_BINARY_FORMATS:
+            text = base64.b64encode(data).decode('ascii')
+        else:
+            text = data.decode('utf-8', errors='replace')
+        
+        payload = {
+            'text': text,
+            'from': PANDOC_READER_MAP[input_ext],
+            'to': PANDOC_FORMAT_MAP.get(target_format, target_format),
+            'standalone': True,
+        }
+        
+        async with _pandoc_session.post(
+            _pandoc_server_url,
+            json=payload,
+            headers={'Accept': 'application/json'}
+        ) as resp:
+            if resp.status != 200:
+                raise ConversionError(f"pandoc server: {await resp.text()}")
+            result = await resp.json()
+        
+        if result.get('base64'):
+            output = base64.b64decode(result['output'])
+        else:
+            output = result['output'].encode('utf-8')
+        
+        async with aiofiles.open(output_path, 'wb') as f:
+            await f.write(output)
+    
+    except Exception as e:
+        raise ConversionError(f"pandoc server: {str(e) or type(e).__name__}")
 
 
 async def convert_document(
@@ -229,6 +813,8 @@ async def convert_document(
 ) -> str:
     """
     Конвертирует документ в указанный формат через Pandoc
+    Если запущен pandoc server, запрос уходит к нему без нового процесса;
+    при ошибке сервера документ конвертируется через pandoc CLI
     
     Args:
         input_path: Путь к исходному файлу
@@ -241,42 +827,228 @@ async def convert_document(
     Raises:
         ConversionError: При ошибке конвертации
     """
-    try:
-        def _convert():
-            # Маппинг форматов для Pandoc
-            pandoc_format_map = {
-                'docx': 'docx',
-                'doc': 'doc',
-                'pdf': 'pdf',
-                'txt': 'plain',
-                'rtf': 'rtf',
-                'odt': 'odt',
-            }
-            
-            input_ext = Path(input_path).suffix.lower().lstrip('.')
-            input_format = pandoc_format_map.get(input_ext, input_ext)
-            output_format = pandoc_format_map.get(target_format, target_format)
-            
-            # Для PDF нужен дополнительный параметр
-            extra_args = []
-            if target_format == 'pdf':
-                extra_args = ['--pdf-engine=xelatex']
-            
-            pypandoc.convert_file(
-                input_path,
-                output_format,
-                outputfile=output_path,
-                extra_args=extra_args if extra_args else None
-            )
+    input_ext = Path(input_path).suffix.lower().lstrip('.')
+    if pandoc_server_supports(input_ext, target_format):
+        try:
+            await _convert_document_via_server(input_path, output_path, target_format)
+            logger.info(f"Документ сконвертирован: {input_path} -> {output_path}")
             return output_path
+        except ConversionError as e:
+            logger.warning(f"{e}, повтор через pandoc CLI")
+    
+    await run_in_executor(_convert_document_sync, input_path, output_path, target_format)
+    logger.info(f"Документ сконвертирован: {input_path} -> {output_path}")
+    return output_path
+
+
+async def start_pandoc_server(port: int, timeout: int) -> bool:
+    """
+    Запускает постоянный процесс pandoc server
+    Старые версии Pandoc (до 2.18) режима server не имеют - тогда
+    документы по-прежнему конвертируются запуском pandoc на каждый файл
+    
+    Args:
+        port: Порт для pandoc server (0 - любой свободный порт)
+        timeout: Лимит времени на одну конвертацию (секунды)
+    
+    Returns:
+        True если сервер запущен и отвечает на запросы
+    """
+    global _pandoc_server, _pandoc_session, _pandoc_server_url
+    
+    if port == 0:
+        # pandoc server не сообщает, какой порт выбрал, поэтому свободный
+        # порт берём у ОС сами. Если его успеют занять, сервер завершится
+        # и документы пойдут через CLI
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+    
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'pandoc', 'server', '--port', str(port), '--timeout', str(timeout),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError as e:
+        logger.warning(f"Не удалось запустить pandoc server: {e}")
+        return False
+    
+    url = f"http://127.0.0.1:{port}"
+    # Клиентский таймаут чуть больше серверного, чтобы сервер успел
+    # сам прервать зависшую конвертацию и вернуть ошибку
+    session = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=timeout + 5)
+    )
+    
+    # Ждём, пока сервер начнёт принимать запросы (до 5 секунд)
+    for _ in range(50):
+        if process.returncode is not None:
+            break
+        try:
+            async with session.get(f"{url}/version") as resp:
+                if resp.status == 200:
+                    _pandoc_server = process
+                    _pandoc_session = session
+                    _pandoc_server_url = url
+                    logger.info(f"pandoc server запущен: {url}")
+                    return True
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    
+    await session.close()
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+    
+    logger.warning("pandoc server недоступен, документы конвертируются через pandoc CLI")
+    return False
+
+
+async def stop_pandoc_server() -> None:
+    """
+    Останавливает pandoc server и закрывает HTTP-сессию к нему
+    """
+    global _pandoc_server, _pandoc_session, _pandoc_server_url
+    
+    if _pandoc_session is not None:
+        await _pandoc_session.close()
+    
+    if _pandoc_server is not None and _pandoc_server.returncode is None:
+        _pandoc_server.terminate()
+        await _pandoc_server.wait()
+    
+    _pandoc_server = None
+    _pandoc_session = None
+    _pandoc_server_url = None
+
+
+def pandoc_server_supports(source_format: str, target_format: str) -> bool:
+    """
+    Проверяет, может ли pandoc server выполнить конвертацию
+    PDF сервер не создаёт (нужен запуск LaTeX), а doc и pdf Pandoc
+    не читает - такие файлы идут через CLI без лишнего запроса к серверу
+    
+    Args:
+        source_format: Исходный формат файла
+        target_format: Целевой формат
+    
+    Returns:
+        True если pandoc server запущен и поддерживает оба формата
+    """
+    return (
+        _pandoc_server_url is not None
+        and source_format in PANDOC_READER_MAP
+        and target_format != 'pdf'
+    )
+
+
+def _detect_csv_encoding(source: str | BinaryIO) -> str:
+    """
+    Определяет кодировку CSV по первым ENCODING_SAMPLE_SIZE байтам
+    
+    Args:
+        source: Путь к файлу или файловый объект
+    
+    Returns:
+        Название кодировки
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            sample = f.read(ENCODING_SAMPLE_SIZE)
+    else:
+        sample = source.read(ENCODING_SAMPLE_SIZE)
+        source.seek(0)
+    
+    # Большинство файлов в UTF-8: проверяем без угадывания.
+    # Последний символ мог обрезаться на границе фрагмента - такая ошибка
+    # бывает только в конце данных, любая другая означает не UTF-8
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        if len(sample) == ENCODING_SAMPLE_SIZE and e.reason == 'unexpected end of data':
+            return 'utf-8'
+    
+    best = from_bytes(sample, cp_isolation=list(CSV_FALLBACK_ENCODINGS)).best()
+    return best.encoding if best is not None else CSV_FALLBACK_ENCODINGS[0]
+
+
+def _write_xlsx(df: pd.DataFrame, destination: str | BinaryIO) -> None:
+    """
+    Записывает таблицу в xlsx через openpyxl в режиме write_only
+    Строки пишутся по одной, без дерева объектов ячеек в памяти
+    
+    Args:
+        df: Таблица для записи
+        destination: Путь для сохранения результата или файловый объект
+    """
+    wb = Workbook(write_only=True)
+    # Имя листа и заголовки - как у df.to_excel
+    ws = wb.create_sheet(title='Sheet1')
+    
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        # NaN, NaT и pd.NA записываем пустыми ячейками, как df.to_excel
+        ws.append([None if pd.isna(value) else value for value in row])
+    
+    wb.save(destination)
+
+
+def _convert_spreadsheet_sync(
+    source: str | BinaryIO,
+    destination: str | BinaryIO,
+    source_format: str,
+    target_format: str
+) -> None:
+    """
+    Синхронная конвертация таблицы
+    CSV читается и пишется через pyarrow, Excel читается через calamine
+    Работает как с путями к файлам, так и с файловыми объектами в памяти
+    
+    Args:
+        source: Путь к исходному файлу или файловый объект
+        destination: Путь для сохранения результата или файловый объект
+        source_format: Исходный формат (xlsx, xls, csv)
+        target_format: Целевой формат (csv, xlsx)
+    
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    try:
+        input_ext = source_format.lower()
+        table = None
+        df = None
         
-        result = await run_in_executor(_convert)
-        logger.info(f"Документ сконвертирован: {input_path} -> {output_path}")
-        return result
+        # Читаем входной файл
+        if input_ext in ('xlsx', 'xls'):
+            df = pd.read_excel(source, engine='calamine')
+        elif input_ext == 'csv':
+            encoding = _detect_csv_encoding(source)
+            table = pa_csv.read_csv(
+                source,
+                read_options=pa_csv.ReadOptions(encoding=encoding)
+            )
+        else:
+            raise ConversionError(f"Неподдерживаемый формат таблицы: {input_ext}")
         
+        # Сохраняем в целевой формат
+        if target_format == 'csv':
+            if table is not None:
+                pa_csv.write_csv(table, destination)
+            else:
+                df.to_csv(destination, index=False, encoding='utf-8')
+        elif target_format == 'xlsx':
+            if df is None:
+                df = table.to_pandas()
+            _write_xlsx(df, destination)
+        else:
+            raise ConversionError(f"Неподдерживаемый целевой формат: {target_format}")
+    
     except Exception as e:
-        logger.error(f"Ошибка конвертации документа: {e}")
-        raise ConversionError(f"Не удалось конвертировать документ: {e}")
+        logger.error(f"Ошибка конвертации таблицы: {e}")
+        raise ConversionError(f"Не удалось конвертировать таблицу: {e}")
 
 
 async def convert_spreadsheet(
@@ -298,50 +1070,29 @@ async def convert_spreadsheet(
     Raises:
         ConversionError: При ошибке конвертации
     """
-    try:
-        def _convert():
-            input_ext = Path(input_path).suffix.lower().lstrip('.')
-            
-            # Читаем входной файл
-            if input_ext in ('xlsx', 'xls'):
-                df = pd.read_excel(input_path)
-            elif input_ext == 'csv':
-                # Пробуем разные кодировки
-                for encoding in ['utf-8', 'cp1251', 'latin-1']:
-                    try:
-                        df = pd.read_csv(input_path, encoding=encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    df = pd.read_csv(input_path, encoding='utf-8', errors='ignore')
-            else:
-                raise ConversionError(f"Неподдерживаемый формат таблицы: {input_ext}")
-            
-            # Сохраняем в целевой формат
-            if target_format == 'csv':
-                df.to_csv(output_path, index=False, encoding='utf-8')
-            elif target_format == 'xlsx':
-                df.to_excel(output_path, index=False, engine='openpyxl')
-            else:
-                raise ConversionError(f"Неподдерживаемый целевой формат: {target_format}")
-            
-            return output_path
-        
-        result = await run_in_executor(_convert)
-        logger.info(f"Таблица сконвертирована: {input_path} -> {output_path}")
-        return result
-        
-    except Exception as e:
-        logger.error(f"Ошибка конвертации таблицы: {e}")
-        raise ConversionError(f"Не удалось конвертировать таблицу: {e}")
+    input_ext = Path(input_path).suffix.lower().lstrip('.')
+    await run_in_executor(
+        _convert_spreadsheet_sync, input_path, output_path, input_ext, target_format
+    )
+    logger.info(f"Таблица сконвертирована: {input_path} -> {output_path}")
+    return output_path
+
+
+# Конвертеры, которые запускают ffmpeg/pandoc и ждут их завершения:
+# GIL при этом свободен, поэтому им достаточно пула потоков
+_IO_BOUND_FUNCS = frozenset({
+    _convert_audio_sync,
+    _convert_video_sync,
+    _convert_document_sync,
+})
 
 
 async def convert_file(
     input_path: str, 
     output_path: str, 
     source_format: str,
-    target_format: str
+    target_format: str,
+    stream_copy: bool = True
 ) -> str:
     """
     Универсальная функция конвертации файла
@@ -352,6 +1103,7 @@ async def convert_file(
         output_path: Путь для сохранения результата
         source_format: Исходный формат файла
         target_format: Целевой формат
+        stream_copy: Копировать потоки видео без перекодирования, если возможно
     
     Returns:
         Путь к сконвертированному файлу
@@ -368,7 +1120,7 @@ async def convert_file(
     elif file_type == 'audio':
         return await convert_audio(input_path, output_path, target_format)
     elif file_type == 'video':
-        return await convert_video(input_path, output_path, target_format)
+        return await convert_video(input_path, output_path, target_format, stream_copy)
     elif file_type in ('document', 'pdf', 'text'):
         return await convert_document(input_path, output_path, target_format)
     elif file_type == 'spreadsheet':
@@ -377,20 +1129,117 @@ async def convert_file(
         raise ConversionError(f"Неподдерживаемый тип файла: {source_format}")
 
 
-async def save_file_from_bytes(data: bytes, path: str) -> str:
+def supports_stream(source_format: str) -> bool:
     """
-    Сохраняет байты в файл асинхронно
+    Проверяет, можно ли сконвертировать файл полностью в памяти
     
     Args:
-        data: Данные для сохранения
-        path: Путь к файлу
+        source_format: Исходный формат файла
+    
+    Returns:
+        True если конвертер работает с потоками, False если нужен файл на диске
+    """
+    from app.keyboards.inline import get_file_type
+    
+    return get_file_type(source_format) in STREAM_FILE_TYPES
+
+
+def convert_bytes_sync(
+    data: bytes,
+    source_format: str,
+    target_format: str,
+    quantize: bool = False,
+    max_dim: int | None = None
+) -> bytes:
+    """
+    Синхронная конвертация в памяти для запуска в пуле процессов
+    Принимает и возвращает байты: файловый объект, изменённый в дочернем
+    процессе, в родительский не возвращается
+    
+    Args:
+        data: Содержимое исходного файла
+        source_format: Исходный формат файла
+        target_format: Целевой формат
+        quantize: Сократить PNG до палитры из 256 цветов
+        max_dim: Максимальный размер большей стороны изображения (None - без уменьшения)
+    
+    Returns:
+        Содержимое сконвертированного файла
+    
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    from app.keyboards.inline import get_file_type
+    
+    source = io.BytesIO(data)
+    output = io.BytesIO()
+    
+    file_type = get_file_type(source_format)
+    
+    if file_type == 'image':
+        _convert_image_sync(source, output, target_format, quantize, max_dim)
+    elif file_type == 'spreadsheet':
+        _convert_spreadsheet_sync(source, output, source_format, target_format)
+    else:
+        raise ConversionError(f"Тип файла не поддерживает конвертацию в памяти: {source_format}")
+    
+    return output.getvalue()
+
+
+async def convert_stream(
+    input_data: bytes | BinaryIO,
+    source_format: str,
+    target_format: str,
+    quantize: bool = False,
+    max_dim: int | None = None
+) -> io.BytesIO:
+    """
+    Конвертирует файл в памяти без временных файлов на диске
+    Поддерживаются только типы из STREAM_FILE_TYPES
+    
+    Args:
+        input_data: Содержимое исходного файла (байты или файловый объект)
+        source_format: Исходный формат файла
+        target_format: Целевой формат
+        quantize: Сократить PNG до палитры из 256 цветов
+        max_dim: Максимальный размер большей стороны изображения (None - без уменьшения)
     
     Returns:
-        Путь к сохранённому файлу
+        Буфер с результатом конвертации (позиция в начале)
+    
+    Raises:
+        ConversionError: При ошибке конвертации
+    """
+    if not isinstance(input_data, (bytes, bytearray)):
+        input_data = input_data.read()
+    
+    output = io.BytesIO(
+        await run_in_executor(
+            convert_bytes_sync, input_data, source_format, target_format, quantize, max_dim
+        )
+    )
+    logger.info(f"Файл сконвертирован в памяти: {source_format} -> {target_format}")
+    return output
+
+
+def make_temp_path(prefix: str, extension: str) -> str:
+    """
+    Создаёт уникальный временный файл и возвращает путь к нему
+    Нужен для конвертеров, которые работают только с файлами (ffmpeg, pandoc)
+    
+    Args:
+        prefix: Префикс имени файла
+        extension: Расширение файла (без точки)
+    
+    Returns:
+        Путь к созданному временному файлу
     """
-    async with aiofiles.open(path, 'wb') as f:
-        await f.write(data)
-    return path
+    with tempfile.NamedTemporaryFile(
+        prefix=prefix,
+        suffix=f".{extension}",
+        delete=False
+    ) as f:
+        return f.name
 
 
 async def read_file_bytes(path: str) -> bytes:
@@ -407,17 +1256,32 @@ async def read_file_bytes(path: str) -> bytes:
         return await f.read()
 
 
-async def cleanup_files(*paths: str) -> None:
+def _remove_files(paths: tuple[str, ...]) -> None:
     """
-    Удаляет временные файлы
+    Удаляет временные файлы (блокирующий вызов)
+    Без предварительной проверки exists: один системный вызов на файл
+    и нет гонки между проверкой и удалением
     
     Args:
-        *paths: Пути к файлам для удаления
+        paths: Пути к файлам для удаления
     """
     for path in paths:
         try:
-            if os.path.exists(path):
-                os.remove(path)
-                logger.debug(f"Удалён временный файл: {path}")
-        except Exception as e:
+            os.unlink(path)
+            logger.debug(f"Удалён временный файл: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
             logger.warning(f"Не удалось удалить файл {path}: {e}")
+
+
+async def cleanup_files(*paths: str) -> None:
+    """
+    Удаляет временные файлы
+    Удаление выполняется одним вызовом в потоке и не блокирует event loop
+    
+    Args:
+        *paths: Пути к файлам для удаления
+    """
+    if paths:
+        await asyncio.to_thread(_remove_files, paths)
@@ -0,0 +1,62 @@
+"""
+Тесты конвертации аудио через PyAV
+"""
+
+import av
+import numpy as np
+
+from app.utils.converter_logic import _supported_sample_rate, _convert_audio_sync
+
+
+MP3_RATES = (44100, 48000, 32000, 22050, 24000, 16000, 11025, 12000, 8000)
+
+
+def test_supported_rate_kept():
+    assert _supported_sample_rate(44100, MP3_RATES) == 44100
+
+
+def test_any_rate_when_codec_has_no_list():
+    assert _supported_sample_rate(96000, None) == 96000
+
+
+def test_rate_clamped_to_nearest_lower():
+    assert _supported_sample_rate(96000, MP3_RATES) == 48000
+    assert _supported_sample_rate(46000, MP3_RATES) == 44100
+
+
+def test_rate_below_all_supported_uses_minimum():
+    assert _supported_sample_rate(4000, MP3_RATES) == 8000
+
+
+def _write_flac(path, rate: int) -> None:
+    samples = (np.sin(np.arange(rate // 10) / 20) * 10000).astype(np.int16)
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream("flac", rate=rate, layout="mono")
+        frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def test_96khz_flac_to_mp3(tmp_path):
+    source = tmp_path / "hi-res.flac"
+    output = tmp_path / "hi-res.mp3"
+    _write_flac(source, 96000)
+    
+    _convert_audio_sync(str(source), str(output), "mp3")
+    
+    with av.open(str(output)) as container:
+        assert container.streams.audio[0].rate == 48000
+
+
+def test_96khz_flac_to_flac_keeps_rate(tmp_path):
+    source = tmp_path / "hi-res.flac"
+    output = tmp_path / "copy.flac"
+    _write_flac(source, 96000)
+    
+    _convert_audio_sync(str(source), str(output), "flac")
+    
+    with av.open(str(output)) as container:
+        assert container.streams.audio[0].rate == 96000
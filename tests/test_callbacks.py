@@ -0,0 +1,91 @@
+"""
+Тесты защиты от повторных нажатий и лимита конвертаций пользователя
+"""
+
+import gc
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.handlers import callbacks
+
+
+class FakeState:
+    def __init__(self, data: dict):
+        self._data = data
+    
+    async def get_data(self) -> dict:
+        return dict(self._data)
+
+
+def _callback(user_id: int, data: str = "cvt:png") -> SimpleNamespace:
+    return SimpleNamespace(
+        from_user=SimpleNamespace(id=user_id),
+        data=data,
+        answer=AsyncMock()
+    )
+
+
+def test_repeated_press_is_ignored_while_converting(monkeypatch):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    processed = []
+    
+    async def fake_process(callback, *args):
+        processed.append(callback)
+        started.set()
+        await release.wait()
+    
+    monkeypatch.setattr(callbacks, "_process_conversion", fake_process)
+    state = FakeState({"file_id": "file-1"})
+    
+    async def run():
+        first_press = _callback(1)
+        second_press = _callback(1)
+        semaphore = asyncio.Semaphore(1)
+        
+        first = asyncio.create_task(
+            callbacks.handle_conversion(first_press, None, state, semaphore)
+        )
+        await started.wait()
+        await callbacks.handle_conversion(second_press, None, state, semaphore)
+        release.set()
+        await first
+        
+        return first_press, second_press
+    
+    first_press, second_press = asyncio.run(run())
+    
+    assert processed == [first_press]
+    second_press.answer.assert_awaited_once_with("⏳ Уже обрабатывается", show_alert=True)
+    assert not callbacks._inflight
+
+
+def test_press_allowed_again_after_conversion(monkeypatch):
+    process = AsyncMock()
+    monkeypatch.setattr(callbacks, "_process_conversion", process)
+    state = FakeState({"file_id": "file-1"})
+    
+    async def run():
+        semaphore = asyncio.Semaphore(1)
+        await callbacks.handle_conversion(_callback(1), None, state, semaphore)
+        await callbacks.handle_conversion(_callback(1), None, state, semaphore)
+    
+    asyncio.run(run())
+    
+    assert process.await_count == 2
+
+
+def test_user_semaphore_shared_per_user():
+    first = callbacks._get_user_semaphore(101)
+    
+    assert callbacks._get_user_semaphore(101) is first
+    assert callbacks._get_user_semaphore(102) is not first
+    assert first._value == callbacks.PER_USER_CONVERSIONS
+
+
+def test_user_semaphore_dropped_when_unused():
+    callbacks._get_user_semaphore(103)
+    gc.collect()
+    
+    assert 103 not in callbacks._user_semaphores
@@ -0,0 +1,65 @@
+"""
+Тесты определения кодировки CSV
+"""
+
+import io
+
+from app.utils.converter_logic import (
+    _detect_csv_encoding,
+    _convert_spreadsheet_sync,
+    CSV_FALLBACK_ENCODINGS,
+    ENCODING_SAMPLE_SIZE,
+)
+
+
+CP1251_CSV = "Имя,Город\nИван,Москва\nПётр,Казань\n".encode("cp1251")
+
+
+def test_short_cp1251_file(tmp_path):
+    path = tmp_path / "people.csv"
+    path.write_bytes(CP1251_CSV)
+    
+    assert _detect_csv_encoding(str(path)) == "cp1251"
+
+
+def test_header_only_cp1251_file():
+    source = io.BytesIO("Имя,Фамилия,Город\n".encode("cp1251"))
+    
+    assert _detect_csv_encoding(source) == "cp1251"
+    assert source.tell() == 0
+
+
+def test_latin1_file():
+    source = io.BytesIO("name,city\nJosé,Málaga\nFrançois,Nîmes\n".encode("latin-1"))
+    
+    assert _detect_csv_encoding(source) == "latin_1"
+
+
+def test_utf8_file():
+    source = io.BytesIO("Имя,Город\nИван,Москва\n".encode("utf-8"))
+    
+    assert _detect_csv_encoding(source) == "utf-8"
+
+
+def test_utf8_character_cut_at_sample_boundary():
+    # Двухбайтовая "Ж" начинается в последнем байте фрагмента
+    data = b"a" * (ENCODING_SAMPLE_SIZE - 1) + "Ж\n".encode("utf-8")
+    
+    assert _detect_csv_encoding(io.BytesIO(data)) == "utf-8"
+
+
+def test_cp1251_byte_at_sample_boundary():
+    # "я" в cp1251 (0xFF) не бывает в UTF-8 и стоит среди последних 3 байт
+    data = b"a" * (ENCODING_SAMPLE_SIZE - 2) + "я\n".encode("cp1251")
+    
+    assert _detect_csv_encoding(io.BytesIO(data)) in CSV_FALLBACK_ENCODINGS
+
+
+def test_cp1251_csv_converted_to_utf8():
+    output = io.BytesIO()
+    
+    _convert_spreadsheet_sync(io.BytesIO(CP1251_CSV), output, "csv", "csv")
+    
+    text = output.getvalue().decode("utf-8")
+    assert "Иван" in text
+    assert "Москва" in text
@@ -0,0 +1,117 @@
+"""
+Тесты конвертации изображений
+"""
+
+import io
+
+from PIL import Image
+
+from app.utils.converter_logic import _convert_image_sync
+
+
+def _image_bytes(img: Image.Image, fmt: str = "PNG") -> io.BytesIO:
+    source = io.BytesIO()
+    img.save(source, fmt)
+    source.seek(0)
+    return source
+
+
+def _convert(source: io.BytesIO, target_format: str, **kwargs) -> Image.Image:
+    output = io.BytesIO()
+    _convert_image_sync(source, output, target_format, **kwargs)
+    output.seek(0)
+    result = Image.open(output)
+    result.load()
+    return result
+
+
+def _palette_with_transparency() -> Image.Image:
+    img = Image.new("P", (8, 8), 1)
+    img.putpalette([255, 0, 0, 0, 0, 255] + [0] * 762)
+    img.info["transparency"] = 0
+    img.paste(0, (0, 0, 4, 8))
+    return img
+
+
+def test_transparent_palette_to_jpeg_on_white():
+    result = _convert(_image_bytes(_palette_with_transparency()), "jpg")
+    
+    assert result.mode == "RGB"
+    assert all(c > 245 for c in result.getpixel((1, 1)))
+    r, g, b = result.getpixel((6, 6))
+    assert b > 200 and r < 50
+
+
+def test_opaque_palette_to_png_stays_palette():
+    img = Image.new("P", (8, 8), 1)
+    img.putpalette([255, 0, 0, 0, 0, 255] + [0] * 762)
+    
+    result = _convert(_image_bytes(img), "png")
+    
+    assert result.mode == "P"
+
+
+def test_la_to_jpeg_on_white():
+    img = Image.new("LA", (8, 8), (0, 0))
+    img.paste((0, 255), (4, 0, 8, 8))
+    
+    result = _convert(_image_bytes(img), "jpg")
+    
+    assert result.mode == "RGB"
+    assert all(c > 245 for c in result.getpixel((1, 1)))
+    assert all(c < 10 for c in result.getpixel((6, 6)))
+
+
+def test_la_to_png_keeps_alpha():
+    img = Image.new("LA", (8, 8), (100, 128))
+    
+    result = _convert(_image_bytes(img), "png")
+    
+    assert result.mode == "LA"
+    assert result.getpixel((0, 0)) == (100, 128)
+
+
+def test_rgba_to_jpeg_on_white():
+    img = Image.new("RGBA", (8, 8), (200, 100, 50, 128))
+    
+    result = _convert(_image_bytes(img), "jpg")
+    
+    assert result.mode == "RGB"
+    r, g, b = result.getpixel((4, 4))
+    assert abs(r - 227) <= 3 and abs(g - 177) <= 3 and abs(b - 152) <= 3
+
+
+def test_rgba_to_png_quantized_keeps_transparency():
+    img = Image.new("RGBA", (16, 16), (0, 0, 0, 0))
+    img.paste((255, 0, 0, 255), (0, 0, 8, 16))
+    
+    result = _convert(_image_bytes(img), "png", quantize=True)
+    
+    assert result.mode == "P"
+    rgba = result.convert("RGBA")
+    assert rgba.getpixel((2, 2)) == (255, 0, 0, 255)
+    assert rgba.getpixel((12, 12))[3] == 0
+
+
+def test_rgb_to_png_without_quantize_stays_rgb():
+    img = Image.new("RGB", (8, 8), (10, 20, 30))
+    
+    result = _convert(_image_bytes(img), "png")
+    
+    assert result.mode == "RGB"
+
+
+def test_max_dim_downscales_jpeg():
+    img = Image.new("RGB", (1200, 600), (10, 20, 30))
+    
+    result = _convert(_image_bytes(img, "JPEG"), "png", max_dim=300)
+    
+    assert result.size == (300, 150)
+
+
+def test_max_dim_keeps_smaller_image():
+    img = Image.new("RGB", (200, 100), (10, 20, 30))
+    
+    result = _convert(_image_bytes(img), "png", max_dim=300)
+    
+    assert result.size == (200, 100)
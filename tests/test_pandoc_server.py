@@ -0,0 +1,63 @@
+"""
+Тесты выбора между pandoc server и pandoc CLI
+"""
+
+import asyncio
+
+import aiohttp
+import pytest
+
+from app.utils import converter_logic
+from app.utils.converter_logic import convert_document, pandoc_server_supports
+
+
+@pytest.fixture
+def cli_calls(monkeypatch):
+    calls = []
+    
+    async def fake_run_in_executor(func, *args):
+        calls.append(func.__name__)
+    
+    monkeypatch.setattr(converter_logic, "run_in_executor", fake_run_in_executor)
+    return calls
+
+
+def test_server_not_used_when_not_started():
+    assert not pandoc_server_supports("docx", "txt")
+
+
+def test_server_skips_unreadable_sources_and_pdf(monkeypatch):
+    monkeypatch.setattr(converter_logic, "_pandoc_server_url", "http://127.0.0.1:1")
+    
+    assert pandoc_server_supports("txt", "docx")
+    assert pandoc_server_supports("docx", "txt")
+    assert not pandoc_server_supports("doc", "docx")
+    assert not pandoc_server_supports("pdf", "txt")
+    assert not pandoc_server_supports("docx", "pdf")
+
+
+def test_server_error_falls_back_to_cli(monkeypatch, tmp_path, cli_calls):
+    source = tmp_path / "note.txt"
+    source.write_text("# Заголовок\n", encoding="utf-8")
+    
+    async def run():
+        # Порт 1 никто не слушает: запрос к серверу завершится ошибкой
+        async with aiohttp.ClientSession() as session:
+            monkeypatch.setattr(converter_logic, "_pandoc_session", session)
+            monkeypatch.setattr(converter_logic, "_pandoc_server_url", "http://127.0.0.1:1")
+            return await convert_document(str(source), str(tmp_path / "note.docx"), "docx")
+    
+    assert asyncio.run(run()) == str(tmp_path / "note.docx")
+    assert cli_calls == ["_convert_document_sync"]
+
+
+def test_unreadable_source_goes_straight_to_cli(monkeypatch, tmp_path, cli_calls):
+    async def fail_if_called(*args):
+        raise AssertionError("pandoc server не должен вызываться для doc")
+    
+    monkeypatch.setattr(converter_logic, "_pandoc_server_url", "http://127.0.0.1:1")
+    monkeypatch.setattr(converter_logic, "_convert_document_via_server", fail_if_called)
+    
+    asyncio.run(convert_document(str(tmp_path / "old.doc"), str(tmp_path / "old.docx"), "docx"))
+    
+    assert cli_calls == ["_convert_document_sync"]
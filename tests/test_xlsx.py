@@ -0,0 +1,59 @@
+"""
+Тесты записи xlsx
+"""
+
+import io
+import datetime
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from app.utils.converter_logic import _write_xlsx, _convert_spreadsheet_sync
+
+
+def _read_rows(source: io.BytesIO) -> tuple[str, list[list]]:
+    source.seek(0)
+    ws = load_workbook(source).active
+    return ws.title, [[cell.value for cell in row] for row in ws.iter_rows()]
+
+
+def test_missing_values_written_as_empty_cells():
+    df = pd.DataFrame({
+        "float": [1.5, float("nan"), 3.0],
+        "int": pd.array([1, None, 3], dtype="Int64"),
+        "date": pd.to_datetime(["2024-01-01", None, "2024-01-03"]),
+        "text": pd.array(["a", pd.NA, "c"], dtype="string"),
+    })
+    output = io.BytesIO()
+    
+    _write_xlsx(df, output)
+    
+    title, rows = _read_rows(output)
+    assert title == "Sheet1"
+    assert rows == [
+        ["float", "int", "date", "text"],
+        [1.5, 1, datetime.datetime(2024, 1, 1), "a"],
+        [None, None, None, None],
+        [3, 3, datetime.datetime(2024, 1, 3), "c"],
+    ]
+
+
+def test_matches_to_excel():
+    df = pd.DataFrame({"name": ["x", None, "y"], 3: [1.0, float("nan"), 2.5]})
+    ours = io.BytesIO()
+    theirs = io.BytesIO()
+    
+    _write_xlsx(df, ours)
+    df.to_excel(theirs, index=False, engine="openpyxl")
+    
+    assert _read_rows(ours) == _read_rows(theirs)
+
+
+def test_csv_with_empty_cells_to_xlsx():
+    source = io.BytesIO("name,age\nАнна,30\nБорис,\n".encode("utf-8"))
+    output = io.BytesIO()
+    
+    _convert_spreadsheet_sync(source, output, "csv", "xlsx")
+    
+    _, rows = _read_rows(output)
+    assert rows == [["name", "age"], ["Анна", 30], ["Борис", None]]